@@ -7,10 +7,7 @@ from src.subagents import subagents
 from langchain_openai import ChatOpenAI
 from langgraph.store.postgres import PostgresStore
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from src.config.settings import DB_URI, LITELLM_API_KEY, LITELLM_BASE_URL
 
 instructions = """
 # System Prompt
@@ -443,8 +440,8 @@ instructions = """
   """
 
 model = ChatOpenAI(
-    api_key=os.getenv("LITELLM_API_KEY"),
-    base_url=os.getenv("LITELLM_BASE_URL"),
+    api_key=LITELLM_API_KEY,
+    base_url=LITELLM_BASE_URL,
     model="openrouter/minimax/minimax-m2",
     streaming=True, 
     temperature=1.0,
@@ -456,7 +453,7 @@ model = ChatOpenAI(
 #     prd = f.read()
 
 def build_code_agent(*, store: Optional[PostgresStore] = None):
-    store = store or PostgresStore.from_conn_string(os.getenv("DB_URI"))
+    store = store or PostgresStore.from_conn_string(DB_URI)
     return create_deep_agent(
         model=model,
         tools=[web_search, get_current_time, http_request],
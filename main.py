@@ -1,9 +1,34 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from src.config.settings import DB_URI, http_async_client
 from src.routes.chat import router
+from src.tools.http_request import close_http_client
+from src.utils.db import close_pool, get_pool
 import uvicorn
 
-app = FastAPI()
+# Logging dikonfigurasi sekali di entrypoint; modul lain cukup getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared Postgres pool before the first request, close on shutdown.
+    # DB_URI is required; src.routes.chat refuses to import without it.
+    app.state.pool = await get_pool(DB_URI)
+    try:
+        yield
+    finally:
+        await close_pool()
+        await http_async_client.aclose()
+        await close_http_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,5 +40,15 @@ app.add_middleware(
 
 app.include_router(router)
 
+
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception) -> ORJSONResponse:
+    # Satu tempat untuk error tak terduga; route tidak perlu try/except sendiri
+    logger.exception("Unhandled error on %s", request.url.path, exc_info=exc)
+    return ORJSONResponse(
+        status_code=500,
+        content={"detail": "Internal server error"},
+    )
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8008, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8008, reload=True)
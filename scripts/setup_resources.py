@@ -1,18 +1,17 @@
 import asyncio
-import os
 
-from dotenv import load_dotenv
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.store.postgres.aio import AsyncPostgresStore
-from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
 
-from src.config.settings import embedding
+from src.config.settings import DB_URI
+from src.utils.db import create_pool
+from src.utils.embeddings import STORE_INDEX
 from typing import Any
 
 
 PRD_TABLE_SQL = """
 CREATE EXTENSION IF NOT EXISTS pgcrypto;
-CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 CREATE TABLE IF NOT EXISTS prds (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -33,15 +32,41 @@ CREATE TABLE IF NOT EXISTS prds (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Section markdown besar: kompres dengan lz4 dan toast lebih awal
+ALTER TABLE prds SET (toast_tuple_target = 128);
+ALTER TABLE prds
+    ALTER COLUMN introduction SET STORAGE EXTENDED,
+    ALTER COLUMN introduction SET COMPRESSION lz4,
+    ALTER COLUMN user_stories SET STORAGE EXTENDED,
+    ALTER COLUMN user_stories SET COMPRESSION lz4,
+    ALTER COLUMN functional_requirements SET STORAGE EXTENDED,
+    ALTER COLUMN functional_requirements SET COMPRESSION lz4,
+    ALTER COLUMN non_functional_requirements SET STORAGE EXTENDED,
+    ALTER COLUMN non_functional_requirements SET COMPRESSION lz4,
+    ALTER COLUMN assumptions SET STORAGE EXTENDED,
+    ALTER COLUMN assumptions SET COMPRESSION lz4,
+    ALTER COLUMN dependencies SET STORAGE EXTENDED,
+    ALTER COLUMN dependencies SET COMPRESSION lz4,
+    ALTER COLUMN risks_and_mitigations SET STORAGE EXTENDED,
+    ALTER COLUMN risks_and_mitigations SET COMPRESSION lz4,
+    ALTER COLUMN timeline SET STORAGE EXTENDED,
+    ALTER COLUMN timeline SET COMPRESSION lz4,
+    ALTER COLUMN stakeholders SET STORAGE EXTENDED,
+    ALTER COLUMN stakeholders SET COMPRESSION lz4,
+    ALTER COLUMN metrics SET STORAGE EXTENDED,
+    ALTER COLUMN metrics SET COMPRESSION lz4;
+
 CREATE INDEX IF NOT EXISTS idx_prds_user_id ON prds (user_id);
 CREATE INDEX IF NOT EXISTS idx_prds_user_created ON prds (user_id, created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_prds_user_stories ON prds USING GIN (user_stories gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_prds_created_brin ON prds USING BRIN (created_at) WITH (pages_per_range = 32);
 
 DROP INDEX IF EXISTS idx_prds_user_feature;
 DROP INDEX IF EXISTS idx_prds_feature;
+-- Trigram GIN tidak dipakai query mana pun
+DROP INDEX IF EXISTS idx_prds_user_stories;
+DROP INDEX IF EXISTS idx_prds_feature_trgm;
 
 CREATE INDEX IF NOT EXISTS idx_prds_user_feature_hash ON prds (user_id, md5(feature));
-CREATE INDEX IF NOT EXISTS idx_prds_feature_trgm ON prds USING GIN (feature gin_trgm_ops);
 """
 
 # Tambahan: Modifikasi tabel checkpoints untuk menambah kolom user_id
@@ -54,9 +79,40 @@ ADD COLUMN IF NOT EXISTS user_id VARCHAR(255);
 CREATE INDEX IF NOT EXISTS idx_checkpoints_user_id 
 ON checkpoints (user_id);
 
--- Index gabungan untuk query yang sering: filter by user_id + thread_id
-CREATE INDEX IF NOT EXISTS idx_checkpoints_user_thread 
-ON checkpoints (user_id, thread_id);
+-- Index gabungan untuk daftar thread per user: filter by user_id + thread_id,
+-- checkpoint terakhir per thread diambil dari index yang sama
+CREATE INDEX IF NOT EXISTS idx_checkpoints_user_thread_checkpoint
+ON checkpoints (user_id, thread_id, checkpoint_id);
+
+-- Digantikan oleh idx_checkpoints_user_thread_checkpoint (prefix yang sama)
+DROP INDEX IF EXISTS idx_checkpoints_user_thread;
+"""
+
+# Store lama memakai vector(1536) + cosine; migrasikan ke halfvec + inner product
+STORE_VECTORS_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'store_vectors'
+          AND column_name = 'embedding'
+          AND udt_name = 'vector'
+    ) THEN
+        DROP INDEX IF EXISTS store_vectors_embedding_idx;
+        ALTER TABLE store_vectors
+            ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE indexname = 'store_vectors_embedding_idx'
+          AND indexdef LIKE '%halfvec_ip_ops%'
+    ) THEN
+        DROP INDEX IF EXISTS store_vectors_embedding_idx;
+        CREATE INDEX store_vectors_embedding_idx ON store_vectors
+            USING hnsw (embedding halfvec_ip_ops) WITH (m = 16, ef_construction = 64);
+    END IF;
+END $$;
 """
 
 SAVE_PRD_FUNCTION_SQL = """
@@ -141,9 +197,6 @@ $$ LANGUAGE plpgsql SECURITY DEFINER;
 """
 
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    return embedding.embed_documents(texts)
-
 async def initialize_resource(resource: Any) -> None:
     """
     Run setup() for resources that support it; tolerate repeated invocations.
@@ -163,41 +216,42 @@ async def initialize_resource(resource: Any) -> None:
             raise
 
 
-async def run_sql(db_uri: str, statement: str) -> None:
-    conn = await AsyncConnection.connect(db_uri)
-    try:
-        async with conn.cursor() as cur:
-            await cur.execute(statement)
-        await conn.commit()
-    finally:
-        await conn.close()
-
+async def run_sql(pool: AsyncConnectionPool, statement: str) -> None:
+    # Multi-statement scripts cannot be server-side prepared.
+    async with pool.connection() as conn:
+        await conn.execute(statement, prepare=False)
 
-async def setup_prd_schema(db_uri: str) -> None:
-    await run_sql(db_uri, PRD_TABLE_SQL)
-    await run_sql(db_uri, SAVE_PRD_FUNCTION_SQL)
 
+async def setup_prd_schema(pool: AsyncConnectionPool) -> None:
+    async with pool.connection() as conn, conn.transaction():
+        await conn.execute(PRD_TABLE_SQL, prepare=False)
+        await conn.execute(SAVE_PRD_FUNCTION_SQL, prepare=False)
 
-async def main() -> None:
-    load_dotenv()
-    db_uri = os.getenv("DB_URI")
-    if not db_uri:
-        raise RuntimeError("DB_URI not configured")
-
-    await setup_prd_schema(db_uri)
 
+async def setup_checkpointer(pool: AsyncConnectionPool) -> None:
     # Setup checkpointer dulu (biar tabel checkpoints dibuat)
-    async with AsyncPostgresSaver.from_conn_string(db_uri) as checkpointer:
-        await initialize_resource(checkpointer)
+    await initialize_resource(AsyncPostgresSaver(pool))
 
     # BARU tambahkan kolom user_id setelah tabel checkpoints ada
-    await run_sql(db_uri, CHECKPOINTS_USER_ID_SQL)
+    await run_sql(pool, CHECKPOINTS_USER_ID_SQL)
+
+
+async def setup_store(pool: AsyncConnectionPool) -> None:
+    await initialize_resource(AsyncPostgresStore(pool, index=STORE_INDEX))
+    await run_sql(pool, STORE_VECTORS_SQL)
+
+
+async def main() -> None:
+    if not DB_URI:
+        raise RuntimeError("DB_URI not configured")
 
-    async with AsyncPostgresStore.from_conn_string(
-        db_uri,
-        index={"dims": 1536, "embed": embed_texts},
-    ) as store:
-        await initialize_resource(store)
+    async with create_pool(DB_URI, min_size=3, max_size=10) as pool:
+        # Schema PRD, checkpointer dan store saling independen
+        await asyncio.gather(
+            setup_prd_schema(pool),
+            setup_checkpointer(pool),
+            setup_store(pool),
+        )
 
     print("Database resources are ready.")
 
@@ -3,12 +3,13 @@ from __future__ import annotations
 from typing import Iterable, Optional
 
 from langchain.agents import create_agent
-from langchain.agents.middleware import SummarizationMiddleware
 from langgraph.store.base import BaseStore
 from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from src.middleware.errors import handle_tool_errors
 from src.middleware.model_selector import ModelSelectorMiddleware
+from src.middleware.prompt import fill_prompt_placeholders
+from src.middleware.summarization import GatedSummarizationMiddleware
 from src.tools import execute_bash, generate_prd, get_current_time, http_request, web_search, update_prd 
 from src.config.settings import simple_model
 from src.middleware.todo import TodoListMiddleware
@@ -66,17 +67,19 @@ def build_agent(
     Parameters
     ----------
     system_prompt:
-        Prompt template used as the system instructions. Accepts `{user_id}` and
-        `{thread_id}` placeholders that can be formatted by the caller.
+        Prompt template used as the system instructions. Its `{user_id}` and
+        `{thread_id}` placeholders are filled per request from the request
+        context, so one compiled agent can serve every thread.
     checkpointer:
         Optional LangGraph checkpointer for persistence.
     store:
         Optional vector store for contextual retrieval.
     """
     middleware = [
+        fill_prompt_placeholders,
         ModelSelectorMiddleware(),
         handle_tool_errors,
-        SummarizationMiddleware(
+        GatedSummarizationMiddleware(
             model=simple_model,
             max_tokens_before_summary=4000,
             messages_to_keep=20
@@ -86,17 +89,10 @@ def build_agent(
 
     return create_agent(
         model=simple_model,
-        tools=[
-            web_search,
-            generate_prd,
-            update_prd,
-            get_current_time,
-            execute_bash,
-            http_request
-        ],
+        tools=list(_base_tools()),
         checkpointer=checkpointer,
         store=store,
-        system_prompt=DEFAULT_SYSTEM_PROMPT,
+        system_prompt=system_prompt,
         middleware=middleware,
     )
 
@@ -1,43 +1,92 @@
+from langchain_core.caches import InMemoryCache
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
 from dotenv import load_dotenv
+import httpx
 import os
 
 load_dotenv()
 
+# Environment is read once here; other modules import these constants.
+LITELLM_API_KEY = os.getenv("LITELLM_API_KEY")
+LITELLM_BASE_URL = os.getenv("LITELLM_BASE_URL")
+DB_URI = os.getenv("DB_URI")
+TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+
+# One keep-alive pool to the LiteLLM proxy for every model tier and the
+# embeddings, so the selector -> main model handoff reuses warm connections.
+_http_limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+http_client = httpx.Client(limits=_http_limits)
+http_async_client = httpx.AsyncClient(limits=_http_limits)
+
+# base_model serves the short deterministic model-selection call: cache
+# identical prompts and keep a stalled call from holding up the main model.
 base_model = ChatOpenAI(
-    api_key=os.getenv("LITELLM_API_KEY"),
-    base_url=os.getenv("LITELLM_BASE_URL"),
+    api_key=LITELLM_API_KEY,
+    base_url=LITELLM_BASE_URL,
+    http_client=http_client,
+    http_async_client=http_async_client,
+    model="openrouter/qwen/qwen3-8b",
+    streaming=False,
+    temperature=0.0,
+    cache=InMemoryCache(maxsize=int(os.getenv("BASE_MODEL_CACHE_SIZE", "1024"))),
+    timeout=float(os.getenv("BASE_MODEL_TIMEOUT", "5")),
+)
+
+# Same model for bash command validation, which must produce a full JSON verdict
+# with reasoning; it gets its own longer timeout so a slow but legitimate check
+# is not turned into a refusal.
+safety_model = ChatOpenAI(
+    api_key=LITELLM_API_KEY,
+    base_url=LITELLM_BASE_URL,
+    http_client=http_client,
+    http_async_client=http_async_client,
     model="openrouter/qwen/qwen3-8b",
     streaming=False,
     temperature=0.0,
+    timeout=float(os.getenv("SAFETY_MODEL_TIMEOUT", "30")),
 )
 
+# The simple tier can point at any OpenAI-compatible server, e.g. a local
+# vLLM/llama.cpp instance serving a quantized small model. Defaults to LiteLLM.
 simple_model = ChatOpenAI(
-    api_key=os.getenv("LITELLM_API_KEY"),
-    base_url=os.getenv("LITELLM_BASE_URL"),
-    model="azure/gpt-oss-20b",
+    api_key=os.getenv("SIMPLE_MODEL_API_KEY", LITELLM_API_KEY),
+    base_url=os.getenv("SIMPLE_MODEL_BASE_URL", LITELLM_BASE_URL),
+    http_client=http_client,
+    http_async_client=http_async_client,
+    model=os.getenv("SIMPLE_MODEL", "azure/gpt-oss-20b"),
     streaming=True, 
 )
 
 medium_model = ChatOpenAI(
-    api_key=os.getenv("LITELLM_API_KEY"),
-    base_url=os.getenv("LITELLM_BASE_URL"),
+    api_key=LITELLM_API_KEY,
+    base_url=LITELLM_BASE_URL,
+    http_client=http_client,
+    http_async_client=http_async_client,
     model="azure/gpt-oss-120b",
     streaming=True, 
     temperature=0.0
 )
 
 complex_model = ChatOpenAI(
-    api_key=os.getenv("LITELLM_API_KEY"),
-    base_url=os.getenv("LITELLM_BASE_URL"),
+    api_key=LITELLM_API_KEY,
+    base_url=LITELLM_BASE_URL,
+    http_client=http_client,
+    http_async_client=http_async_client,
     model="azure/gpt-oss-120b",
     streaming=True, 
     temperature=0.0
 )
 
 embedding = OpenAIEmbeddings(
-    api_key=os.getenv("LITELLM_API_KEY"),
-    base_url=os.getenv("LITELLM_BASE_URL"),
-    model="azure/text-embedding-ada-002"
+    api_key=LITELLM_API_KEY,
+    base_url=LITELLM_BASE_URL,
+    http_client=http_client,
+    http_async_client=http_async_client,
+    model="azure/text-embedding-ada-002",
+    chunk_size=int(os.getenv("EMBED_BATCH_SIZE", "96")),
+    max_retries=5,
+    timeout=30,
 )
\ No newline at end of file
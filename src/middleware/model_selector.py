@@ -1,13 +1,116 @@
-from typing import Literal
-from pydantic import BaseModel, Field
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Literal, Optional
+from langchain_core.messages import AnyMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
 from src.config.settings import base_model, simple_model, medium_model, complex_model
 
 
-class ModelComplexity(BaseModel):
-    complexity: Literal["simple", "medium", "complex"] = Field(
-        description="Complexity level of the query"
-    )
+Complexity = Literal["simple", "medium", "complex"]
+
+
+MODEL_BY_COMPLEXITY = {
+    "simple": simple_model,
+    "medium": medium_model,
+    "complex": complex_model,
+}
+
+CLASSIFICATION_CACHE_SIZE = 4096
+SIMPLE_QUERY_CHARS = 120
+COMPLEX_QUERY_CHARS = 500
+
+_COMPLEX_PATTERN = re.compile(
+    r"\b(prd|design|architect\w*|comprehensive|system design|rancang\w*|arsitektur)\b",
+    re.IGNORECASE,
+)
+_MEDIUM_PATTERN = re.compile(
+    r"\b(compare|refactor\w*|optimi[sz]\w*|analy[sz]\w*|bandingkan|optimasi|analisis)\b",
+    re.IGNORECASE,
+)
+_COMPLEXITY_LABEL = re.compile(r"\b(simple|medium|complex)\b", re.IGNORECASE)
+_classification_cache: "OrderedDict[str, str]" = OrderedDict()
+_inflight_classifications: "dict[str, asyncio.Task[str]]" = {}
+
+
+def _query_text(content: Any) -> str:
+    return content if isinstance(content, str) else str(content)
+
+
+def _last_human_message(messages: list[AnyMessage]) -> Optional[HumanMessage]:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message
+    return None
+
+
+def _query_key(query: str) -> str:
+    normalized = " ".join(query.lower().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+def _heuristic_complexity(query: str) -> Optional[str]:
+    """
+    Classify queries locally by length and keywords.
+
+    Only mid-length queries without any keyword hit return None and fall
+    through to the classifier LLM.
+    """
+    length = len(query.strip())
+    if "```" in query or length > COMPLEX_QUERY_CHARS or _COMPLEX_PATTERN.search(query):
+        return "complex"
+    if _MEDIUM_PATTERN.search(query):
+        return "medium"
+    if length < SIMPLE_QUERY_CHARS:
+        return "simple"
+    return None
+
+
+def _cached_complexity(key: str) -> Optional[str]:
+    complexity = _classification_cache.get(key)
+    if complexity is not None:
+        _classification_cache.move_to_end(key)
+    return complexity
+
+
+def _remember_complexity(key: str, complexity: str) -> None:
+    _classification_cache[key] = complexity
+    _classification_cache.move_to_end(key)
+    if len(_classification_cache) > CLASSIFICATION_CACHE_SIZE:
+        _classification_cache.popitem(last=False)
+
+
+# A ready message object: no per-call dict -> message conversion.
+CLASSIFICATION_SYSTEM_MESSAGE = SystemMessage(
+    content=(
+        "Classify query complexity into: simple, medium, or complex.\n\n"
+        "Rules:\n"
+        "- simple: direct questions, single-step tasks (e.g. 'What is X?', 'Fix this typo')\n"
+        "- medium: multi-step logic, analysis, refactoring (e.g. 'Compare A and B', 'Optimize this function')\n"
+        "- complex: long-form content, system design, PRD, high ambiguity (e.g. 'Design a distributed system', 'Write a comprehensive guide')\n\n"
+        "Answer with exactly one word: simple, medium, or complex."
+    ),
+)
+
+# Plain one-word completion: no JSON schema, JSON mode or pydantic parsing.
+_classifier = base_model.with_config(
+    {
+        "callbacks": [],
+        "metadata": {"internal_run": "model_selector"},
+    }
+)
+
+
+def _classification_prompt(query: str) -> list[BaseMessage]:
+    return [CLASSIFICATION_SYSTEM_MESSAGE, HumanMessage(content=query)]
+
+
+def _parse_complexity(content: Any) -> Complexity:
+    match = _COMPLEXITY_LABEL.search(_query_text(content))
+    if match is None:
+        raise ValueError(f"Unrecognized complexity label: {content!r}")
+    return match.group(1).lower()
 
 
 class ModelSelectorMiddleware(AgentMiddleware):
@@ -17,51 +120,53 @@ class ModelSelectorMiddleware(AgentMiddleware):
     - simple_model: one-step tasks
     - medium_model: multi-step reasoning
     - complex_model: long-form generation, system design
+
+    Obvious queries are classified by a local heuristic and classifier results
+    are memoized per normalized query, so repeats skip the extra LLM call.
+    Turns that follow tool calls are routed by the latest user message.
     """
 
+    def _classify(self, query: str) -> str:
+        result = _classifier.invoke(_classification_prompt(query))
+        return _parse_complexity(result.content)
+
+    async def _aclassify(self, query: str) -> str:
+        result = await _classifier.ainvoke(_classification_prompt(query))
+        return _parse_complexity(result.content)
+
+    async def _aclassify_shared(self, query: str, key: str) -> str:
+        """Coalesce concurrent classifications of the same query into one call."""
+        task = _inflight_classifications.get(key)
+        if task is None:
+            task = asyncio.create_task(self._aclassify(query))
+            _inflight_classifications[key] = task
+            task.add_done_callback(lambda _: _inflight_classifications.pop(key, None))
+        # A cancelled waiter must not cancel the call other requests share.
+        return await asyncio.shield(task)
+
     def wrap_model_call(self, request: ModelRequest, handler) -> ModelResponse:
         messages = request.state.get("messages", [])
         if not messages:
             return handler(request)
 
-        query = messages[-1].content
+        human = _last_human_message(messages)
+        if human is None:
+            return handler(request)
+
+        query = _query_text(human.content)
+        key = _query_key(query)
 
         try:
-            classifier = base_model.with_structured_output(
-                ModelComplexity,
-            ).with_config(
-                {
-                    "callbacks": [],
-                    "metadata": {"internal_run": "model_selector"},
-                }
-            )
-            
-            classification_prompt = [
-                {
-                    "role": "system",
-                    "content": (
-                        "Classify query complexity into: simple, medium, or complex.\n\n"
-                        "Rules:\n"
-                        "- simple: direct questions, single-step tasks (e.g. 'What is X?', 'Fix this typo')\n"
-                        "- medium: multi-step logic, analysis, refactoring (e.g. 'Compare A and B', 'Optimize this function')\n"
-                        "- complex: long-form content, system design, PRD, high ambiguity (e.g. 'Design a distributed system', 'Write a comprehensive guide')\n"
-                    ),
-                },
-                {"role": "user", "content": query},
-            ]
-
-            result = classifier.invoke(classification_prompt)
-            
-            if result.complexity == "simple":
-                selected_model = simple_model
-            elif result.complexity == "medium":
-                selected_model = medium_model
-            elif result.complexity == "complex":
-                selected_model = complex_model
-            else:
-                selected_model = base_model
-            
-            request.model = selected_model
+            complexity = _heuristic_complexity(query) or _cached_complexity(key)
+            if complexity is None:
+                # Tool-continuation turns reuse the user turn's classification
+                # and never pay for a new one.
+                if human is not messages[-1]:
+                    return handler(request)
+                complexity = self._classify(query)
+                _remember_complexity(key, complexity)
+
+            request.model = MODEL_BY_COMPLEXITY.get(complexity, base_model)
             return handler(request)
 
         except Exception:
@@ -75,46 +180,25 @@ class ModelSelectorMiddleware(AgentMiddleware):
         if not messages:
             return await handler(request)
 
-        query = messages[-1].content
+        human = _last_human_message(messages)
+        if human is None:
+            return await handler(request)
+
+        query = _query_text(human.content)
+        key = _query_key(query)
 
         try:
-            classifier = base_model.with_structured_output(
-                ModelComplexity,
-                include_raw=False
-            ).with_config(
-                {
-                    "callbacks": [],
-                    "metadata": {"internal_run": "model_selector"},
-                }
-            )
-            
-            classification_prompt = [
-                {
-                    "role": "system",
-                    "content": (
-                        "Classify query complexity into: simple, medium, or complex.\n\n"
-                        "Rules:\n"
-                        "- simple: direct questions, single-step tasks (e.g. 'What is X?', 'Fix this typo')\n"
-                        "- medium: multi-step logic, analysis, refactoring (e.g. 'Compare A and B', 'Optimize this function')\n"
-                        "- complex: long-form content, system design, PRD, high ambiguity (e.g. 'Design a distributed system', 'Write a comprehensive guide')\n"
-                    ),
-                },
-                {"role": "user", "content": query},
-            ]
-
-            result = await classifier.ainvoke(classification_prompt)
-            
-            if result.complexity == "simple":
-                selected_model = simple_model
-            elif result.complexity == "medium":
-                selected_model = medium_model
-            elif result.complexity == "complex":
-                selected_model = complex_model
-            else:
-                selected_model = base_model
-            
-            request.model = selected_model
+            complexity = _heuristic_complexity(query) or _cached_complexity(key)
+            if complexity is None:
+                # Tool-continuation turns reuse the user turn's classification
+                # and never pay for a new one.
+                if human is not messages[-1]:
+                    return await handler(request)
+                complexity = await self._aclassify_shared(query, key)
+                _remember_complexity(key, complexity)
+
+            request.model = MODEL_BY_COMPLEXITY.get(complexity, base_model)
             return await handler(request)
 
         except Exception:
-            return await handler(request)
+            return await handler(request)
\ No newline at end of file
@@ -0,0 +1,33 @@
+from functools import lru_cache
+
+from langchain.agents.middleware import ModelRequest, dynamic_prompt
+from langgraph.config import get_config
+
+from src.utils.request_context import get_thread_id, get_user_id
+
+
+@lru_cache(maxsize=1024)
+def _format_prompt(template: str, user_id: str, thread_id: str) -> str:
+    return template.format(user_id=user_id, thread_id=thread_id)
+
+
+def _configurable() -> dict:
+    try:
+        return get_config().get("configurable", {})
+    except RuntimeError:
+        return {}
+
+
+@dynamic_prompt
+def fill_prompt_placeholders(request: ModelRequest) -> str:
+    """Fill `{user_id}`/`{thread_id}` in the shared agent's prompt for the current request."""
+    user_id = get_user_id()
+    thread_id = get_thread_id()
+    # Outside stream_response (e.g. the graph served from langgraph.json) the
+    # contextvars are unset; the run config carries the same ids
+    if user_id is None or thread_id is None:
+        configurable = _configurable()
+        user_id = user_id or configurable.get("user_id")
+        thread_id = thread_id or configurable.get("thread_id")
+    # Every model call of a thread reuses the same formatted string
+    return _format_prompt(request.system_prompt, user_id or "", thread_id or "")
@@ -0,0 +1,20 @@
+from typing import Any
+
+from langchain.agents.middleware import SummarizationMiddleware
+from langchain.agents.middleware.types import AgentState
+from langgraph.runtime import Runtime
+
+
+class GatedSummarizationMiddleware(SummarizationMiddleware):
+    """
+    SummarizationMiddleware that skips token counting on short histories.
+
+    A conversation with no more than `messages_to_keep` messages can never be
+    summarized (there is nothing before the cutoff), so those turns return
+    before walking every message through the token counter.
+    """
+
+    def before_model(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        if len(state["messages"]) <= self.messages_to_keep:
+            return None
+        return super().before_model(state, runtime)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import TYPE_CHECKING, Annotated, Literal
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
 
+import orjson
 from langchain_core.messages import ToolMessage
 from langchain_core.tools import tool
 from langgraph.types import Command
@@ -146,15 +148,36 @@ Each sub-todo should read like a mini implementation guide that includes:
 - Update status as you progress through implementation"""
 
 
-@tool(description=WRITE_TODOS_TOOL_DESCRIPTION)
-def write_todos(todos: list[Todo], tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
-    """Create and manage a structured task list based on user stories with detailed sub-tasks."""
-    return Command(
-        update={
-            "todos": todos,
-            "messages": [ToolMessage(f"Updated todo list to {todos}", tool_call_id=tool_call_id)],
-        }
-    )
+@lru_cache(maxsize=256)
+def _append_prompt(base: str, suffix: str) -> str:
+    """Join a request prompt with a middleware suffix, reusing earlier results."""
+    return base + suffix
+
+
+def _todos_message(todos: list[Todo]) -> str:
+    return "Updated todo list to " + orjson.dumps(todos).decode()
+
+
+@lru_cache(maxsize=8)
+def _make_write_todos(description: str):
+    """Build the write_todos tool once per description; the tool schema is costly to derive."""
+
+    @tool(description=description)
+    def write_todos(
+        todos: list[Todo], tool_call_id: Annotated[str, InjectedToolCallId]
+    ) -> Command:
+        """Create and manage a structured task list based on user stories with detailed sub-tasks."""
+        return Command(
+            update={
+                "todos": todos,
+                "messages": [ToolMessage(_todos_message(todos), tool_call_id=tool_call_id)],
+            }
+        )
+
+    return write_todos
+
+
+write_todos = _make_write_todos(WRITE_TODOS_TOOL_DESCRIPTION)
 
 
 class TodoListMiddleware(AgentMiddleware):
@@ -186,23 +209,9 @@ class TodoListMiddleware(AgentMiddleware):
     ) -> None:
         super().__init__()
         self.system_prompt = system_prompt
+        self._system_prompt_suffix = "\n\n" + system_prompt
         self.tool_description = tool_description
-
-        @tool(description=self.tool_description)
-        def write_todos(
-            todos: list[Todo], tool_call_id: Annotated[str, InjectedToolCallId]
-        ) -> Command:
-            """Create and manage a structured task list based on user stories with detailed sub-tasks."""
-            return Command(
-                update={
-                    "todos": todos,
-                    "messages": [
-                        ToolMessage(f"Updated todo list to {todos}", tool_call_id=tool_call_id)
-                    ],
-                }
-            )
-
-        self.tools = [write_todos]
+        self.tools = [_make_write_todos(tool_description)]
 
     def wrap_model_call(
         self,
@@ -210,7 +219,7 @@ class TodoListMiddleware(AgentMiddleware):
         handler: Callable[[ModelRequest], ModelResponse],
     ) -> ModelCallResult:
         request.system_prompt = (
-            request.system_prompt + "\n\n" + self.system_prompt
+            _append_prompt(request.system_prompt, self._system_prompt_suffix)
             if request.system_prompt
             else self.system_prompt
         )
@@ -222,7 +231,7 @@ class TodoListMiddleware(AgentMiddleware):
         handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
     ) -> ModelCallResult:
         request.system_prompt = (
-            request.system_prompt + "\n\n" + self.system_prompt
+            _append_prompt(request.system_prompt, self._system_prompt_suffix)
             if request.system_prompt
             else self.system_prompt
         )
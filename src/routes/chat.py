@@ -1,38 +1,130 @@
+import asyncio
+
 from psycopg import AsyncConnection
+from psycopg.rows import class_row, dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
 from langgraph.store.postgres.aio import AsyncPostgresStore
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 
 from src.utils.stream_response import stream_response
 from src.utils.checkpointer import UserAwarePostgresSaver
-from src.config.settings import simple_model, embedding
-from src.agent import build_agent, DEFAULT_SYSTEM_PROMPT
-
-from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.responses import StreamingResponse
+from src.utils.cache import TTLCache
+from src.utils.db import get_pool
+from src.config.settings import DB_URI, simple_model
+from src.utils.embeddings import STORE_INDEX, aembed_texts as embed_batched
+from src.agent import agent as base_agent
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.background import BackgroundTask
 
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Any, Awaitable, Callable, TypeVar
 from datetime import datetime
 
-import os
-from contextlib import AsyncExitStack
-import asyncio
+router = APIRouter(prefix="/api", tags=["chat"], default_response_class=ORJSONResponse)
 
-router = APIRouter(prefix="/api", tags=["chat"])
+T = TypeVar("T")
 
 # ============================================================================
 # CONFIGURATION & DEPENDENCIES
 # ============================================================================
 
-def get_db_uri() -> str:
-    """Dependency untuk mendapatkan DB URI dengan proper error handling"""
-    db_uri = os.getenv("DB_URI")
-    if not db_uri:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database configuration missing"
-        )
-    return db_uri
+# Divalidasi sekali saat import, bukan di setiap request
+if not DB_URI:
+    raise RuntimeError("DB_URI not configured")
+
+# History per (thread_id, user_id); di-invalidate oleh POST chat ke thread yang sama
+HISTORY_CACHE_TTL = 5.0
+history_cache: TTLCache["ThreadHistoryResponse"] = TTLCache(maxsize=1024, ttl=HISTORY_CACHE_TTL)
+
+# Query statis di level modul: teks identik di setiap request sehingga
+# prepared statement per koneksi (prepare_threshold=0) selalu dipakai ulang
+THREAD_ACCESS_SQL = """
+SELECT EXISTS (
+    SELECT 1 FROM checkpoints
+    WHERE thread_id = %s AND user_id = %s
+)
+"""
+
+PRD_INFO_SQL = """
+SELECT
+    id::text AS prd_id, feature, introduction, user_stories,
+    functional_requirements, non_functional_requirements,
+    assumptions, dependencies, risks_and_mitigations,
+    timeline, stakeholders, metrics, version,
+    created_at, updated_at
+FROM prds
+WHERE id::text = %s AND user_id = %s
+ORDER BY version DESC
+LIMIT 1
+"""
+
+# Keyset page of a user's threads without aggregating all their checkpoints:
+# a loose index scan lists the distinct threads, one backward probe per thread
+# finds its latest checkpoint, and checkpoints are only counted for the page.
+# Every step is served by idx_checkpoints_user_thread_checkpoint.
+USER_THREADS_SQL = """
+WITH RECURSIVE threads AS (
+    (
+        SELECT thread_id FROM checkpoints
+        WHERE user_id = %(user_id)s
+        ORDER BY thread_id
+        LIMIT 1
+    )
+    UNION ALL
+    SELECT (
+        SELECT c.thread_id FROM checkpoints c
+        WHERE c.user_id = %(user_id)s AND c.thread_id > t.thread_id
+        ORDER BY c.thread_id
+        LIMIT 1
+    )
+    FROM threads t
+    WHERE t.thread_id IS NOT NULL
+),
+latest AS (
+    SELECT
+        t.thread_id,
+        (
+            SELECT c.checkpoint_id FROM checkpoints c
+            WHERE c.user_id = %(user_id)s AND c.thread_id = t.thread_id
+            ORDER BY c.checkpoint_id DESC
+            LIMIT 1
+        ) as last_checkpoint_id
+    FROM threads t
+    WHERE t.thread_id IS NOT NULL
+),
+page AS (
+    SELECT thread_id, last_checkpoint_id
+    FROM latest
+    WHERE %(before)s::text IS NULL
+        OR last_checkpoint_id < %(before)s::text
+    ORDER BY last_checkpoint_id DESC
+    LIMIT %(limit)s
+)
+SELECT
+    t.thread_id,
+    (
+        SELECT COUNT(DISTINCT c.checkpoint_id) FROM checkpoints c
+        WHERE c.user_id = %(user_id)s AND c.thread_id = t.thread_id
+    ) as message_count,
+    t.last_checkpoint_id,
+    p.id::text as prd_id,
+    p.feature as prd_feature,
+    p.version as prd_version
+FROM page t
+LEFT JOIN prds p ON p.id::text = t.thread_id
+    AND p.user_id = %(user_id)s
+ORDER BY t.last_checkpoint_id DESC
+"""
+
+# Tipe pesan untuk response history, tanpa introspeksi nama class per pesan
+MESSAGE_TYPES = {
+    HumanMessage: "human",
+    AIMessage: "ai",
+    ToolMessage: "tool",
+    SystemMessage: "system",
+}
 
 
 # ============================================================================
@@ -43,8 +135,9 @@ class ChatPayload(BaseModel):
     query: str = Field(..., min_length=1, max_length=5000, description="User's chat query")
     user_id: str = Field(..., min_length=1, max_length=100, description="User's ID")
 
-    @validator('query')
-    def validate_query(cls, v):
+    @field_validator('query')
+    @classmethod
+    def validate_query(cls, v: str) -> str:
         if not v.strip():
             raise ValueError('Query cannot be empty or whitespace only')
         return v.strip()
@@ -94,10 +187,10 @@ class ThreadSummary(BaseModel):
 # HELPER FUNCTIONS
 # ============================================================================
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+async def embed_texts(texts: List[str]) -> List[List[float]]:
     """Embedding function dengan error handling"""
     try:
-        return embedding.embed_documents(texts)
+        return await embed_batched(texts)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -105,55 +198,31 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
         )
 
 
-def schedule_stack_close(stack: AsyncExitStack) -> None:
-    """Cleanup async resources dengan proper error handling"""
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(stack.aclose())
-    except RuntimeError:
-        asyncio.run(stack.aclose())
-    except Exception:
-        return
+async def with_connection(
+    pool: AsyncConnectionPool,
+    fn: Callable[..., Awaitable[T]],
+    *args: Any,
+) -> T:
+    """Jalankan helper query di koneksi pool sendiri supaya bisa paralel"""
+    async with pool.connection() as conn:
+        return await fn(conn, *args)
+
+
+async def check_thread_access(conn: AsyncConnection, thread_id: str, user_id: str) -> bool:
+    """Cek apakah user punya checkpoint di thread ini"""
+    async with conn.cursor(row_factory=tuple_row) as cur:
+        await cur.execute(THREAD_ACCESS_SQL, (thread_id, user_id))
+        return (await cur.fetchone())[0]
 
 
 async def get_prd_info(conn: AsyncConnection, thread_id: str, user_id: str) -> Optional[PRDInfo]:
     """Helper untuk fetch PRD info dengan reusable logic"""
     try:
-        async with conn.cursor() as cur:
-            await cur.execute("""
-                SELECT 
-                    id, feature, introduction, user_stories,
-                    functional_requirements, non_functional_requirements,
-                    assumptions, dependencies, risks_and_mitigations,
-                    timeline, stakeholders, metrics, version,
-                    created_at, updated_at
-                FROM prds 
-                WHERE id::text = %s AND user_id = %s
-                ORDER BY version DESC
-                LIMIT 1
-            """, (thread_id, user_id))
+        async with conn.cursor(row_factory=class_row(PRDInfo)) as cur:
+            await cur.execute(PRD_INFO_SQL, (thread_id, user_id))
             
-            row = await cur.fetchone()
-            if not row:
-                return None
-            
-            return PRDInfo(
-                prd_id=str(row[0]),
-                feature=row[1],
-                introduction=row[2],
-                user_stories=row[3],
-                functional_requirements=row[4],
-                non_functional_requirements=row[5],
-                assumptions=row[6],
-                dependencies=row[7],
-                risks_and_mitigations=row[8],
-                timeline=row[9],
-                stakeholders=row[10],
-                metrics=row[11],
-                version=row[12],
-                created_at=row[13],
-                updated_at=row[14]
-            )
+            # Nama kolom = nama field PRDInfo, psycopg langsung membangun model
+            return await cur.fetchone()
     except Exception:
         return None
 
@@ -178,8 +247,7 @@ async def root():
 )
 async def chat(
     thread_id: str,
-    payload: ChatPayload,
-    db_uri: str = Depends(get_db_uri)
+    payload: ChatPayload
 ):
     """
     Stream chat responses dengan proper resource management.
@@ -193,54 +261,34 @@ async def chat(
             "user_id": payload.user_id,
         }
     }
-
-    stack = AsyncExitStack()
-
-    try:
-        # Initialize resources dengan async context managers
-        checkpointer = await stack.enter_async_context(
-            UserAwarePostgresSaver.from_conn_string(db_uri)
-        )
-        store = await stack.enter_async_context(
-            AsyncPostgresStore.from_conn_string(
-                db_uri,
-                index={"dims": 1536, "embed": embed_texts}
-            )
-        )
-
-        system_prompt = DEFAULT_SYSTEM_PROMPT.format(
-            user_id=payload.user_id,
-            thread_id=thread_id,
-        )
-
-        agent = build_agent(
-            system_prompt=system_prompt,
-            checkpointer=checkpointer,
-            store=store,
-        )
-
-        response = StreamingResponse(
-            stream_response(agent, payload.query, config),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no",
-            },
-            background=BackgroundTask(schedule_stack_close, stack)
-        )
-        
-        stack = None
-        return response
-        
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to process chat request"
-        )
-    finally:
-        if stack is not None:
-            await stack.aclose()
+    history_key = (thread_id, payload.user_id)
+    history_cache.pop(history_key)
+
+    # Checkpointer dan store pakai shared connection pool
+    pool = await get_pool(DB_URI)
+    checkpointer = UserAwarePostgresSaver(pool)
+    store = AsyncPostgresStore(
+        pool,
+        index={**STORE_INDEX, "embed": embed_texts}
+    )
+
+    # Agent dikompilasi sekali; per request cukup ganti checkpointer/store
+    agent = base_agent.copy(update={"checkpointer": checkpointer, "store": store})
+
+    response = StreamingResponse(
+        stream_response(agent, payload.query, config),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "Content-Encoding": "identity",
+        },
+        # Checkpoint baru ditulis selama streaming; buang cache setelah selesai
+        background=BackgroundTask(history_cache.pop, history_key),
+    )
+    
+    return response
 
 
 @router.get(
@@ -254,8 +302,7 @@ async def chat(
 )
 async def get_history(
     thread_id: str,
-    user_id: str,
-    db_uri: str = Depends(get_db_uri)
+    user_id: str
 ):
     """
     Retrieve chat history dan PRD info untuk thread tertentu.
@@ -263,76 +310,70 @@ async def get_history(
     - **thread_id**: Thread identifier
     - **user_id**: User identifier untuk authorization
     """
+    cached = history_cache.get((thread_id, user_id))
+    if cached is not None:
+        return ORJSONResponse(cached.model_dump(mode="json"))
+
+    pool = await get_pool(DB_URI)
+    checkpointer = UserAwarePostgresSaver(pool)
+    config = {"configurable": {"thread_id": thread_id, "user_id": user_id}}
+    
+    # Authorization check, PRD fetch & checkpoint load jalan bersamaan
+    auth_task = asyncio.create_task(with_connection(pool, check_thread_access, thread_id, user_id))
+    prd_task = asyncio.create_task(with_connection(pool, get_prd_info, thread_id, user_id))
+    state_task = asyncio.create_task(checkpointer.aget(config))
     try:
-        async with UserAwarePostgresSaver.from_conn_string(db_uri) as checkpointer:
-            config = {"configurable": {"thread_id": thread_id, "user_id": user_id}}
-            
-            # Authorization check & PRD fetch
-            async with await AsyncConnection.connect(db_uri) as conn:
-                async with conn.cursor() as cur:
-                    # Verify user access
-                    await cur.execute("""
-                        SELECT COUNT(*) FROM checkpoints 
-                        WHERE thread_id = %s AND user_id = %s
-                    """, (thread_id, user_id))
-                    
-                    if (await cur.fetchone())[0] == 0:
-                        raise HTTPException(
-                            status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Unauthorized access to thread"
-                        )
-                
-                # Fetch PRD info
-                prd_info = await get_prd_info(conn, thread_id, user_id)
-            
-            # Get messages from checkpoint
-            state = await checkpointer.aget(config)
-            
-            if not state:
-                return ThreadHistoryResponse(
-                    thread_id=thread_id,
-                    messages=[],
-                    has_prd=prd_info is not None,
-                    prd=prd_info
-                )
-            
-            messages = state.get("channel_values", {}).get("messages", [])
-            
-            # Format messages
-            formatted_messages = []
-            for msg in messages:
-                msg_type = msg.__class__.__name__.replace("Message", "").lower()
-                
-                msg_data = {
-                    "type": msg_type,
-                    "content": msg.content,
-                }
-                
-                if msg_type == "tool" and hasattr(msg, 'name'):
-                    msg_data["tool_name"] = msg.name
-                
-                if msg_type == "ai" and hasattr(msg, 'tool_calls') and msg.tool_calls:
-                    msg_data["tool_calls"] = [
-                        {"name": tc.get("name"), "args": tc.get("args")}
-                        for tc in msg.tool_calls
-                    ]
-                
-                formatted_messages.append(msg_data)
-            
-            return ThreadHistoryResponse(
-                thread_id=thread_id,
-                messages=formatted_messages,
-                has_prd=prd_info is not None,
-                prd=prd_info
+        if not await auth_task:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Unauthorized access to thread"
             )
-                
-    except HTTPException:
-        raise
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve history"
-        )
+        prd_info, state = await asyncio.gather(prd_task, state_task)
+    finally:
+        # Hasil tidak dipakai kalau auth gagal atau salah satu query error
+        for task in (prd_task, state_task):
+            task.cancel()
+    
+    if not state:
+        return ORJSONResponse(ThreadHistoryResponse(
+            thread_id=thread_id,
+            messages=[],
+            has_prd=prd_info is not None,
+            prd=prd_info
+        ).model_dump(mode="json"))
+    
+    messages = state.get("channel_values", {}).get("messages", [])
+    
+    # Format messages
+    formatted_messages = []
+    for msg in messages:
+        msg_type = MESSAGE_TYPES.get(type(msg)) or msg.type
+        
+        if msg_type == "tool":
+            msg_data = {"type": msg_type, "content": msg.content, "tool_name": msg.name}
+        elif msg_type == "ai" and msg.tool_calls:
+            msg_data = {
+                "type": msg_type,
+                "content": msg.content,
+                "tool_calls": [
+                    {"name": tc.get("name"), "args": tc.get("args")}
+                    for tc in msg.tool_calls
+                ],
+            }
+        else:
+            msg_data = {"type": msg_type, "content": msg.content}
+        
+        formatted_messages.append(msg_data)
+    
+    history = ThreadHistoryResponse(
+        thread_id=thread_id,
+        messages=formatted_messages,
+        has_prd=prd_info is not None,
+        prd=prd_info
+    )
+    history_cache.set((thread_id, user_id), history)
+    # Sudah tervalidasi; kirim langsung tanpa validasi ulang oleh response_model
+    return ORJSONResponse(history.model_dump(mode="json"))
 
 
 @router.get(
@@ -344,52 +385,39 @@ async def get_history(
 )
 async def get_user_threads(
     user_id: str,
-    db_uri: str = Depends(get_db_uri)
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    before: Optional[str] = None
 ):
     """
-    List semua threads milik user, sorted by most recent.
+    List threads milik user, sorted by most recent.
+    
+    Tanpa `limit` semua thread dikembalikan. Dengan `limit`, hasil berupa satu
+    halaman; kirim `last_checkpoint_id` item terakhir sebagai `before` untuk
+    halaman berikutnya. Halaman dengan kurang dari `limit` item adalah yang terakhir.
     
     - **user_id**: User identifier
+    - **limit**: Jumlah thread maksimal per halaman (opsional, maks 200)
+    - **before**: `last_checkpoint_id` thread terakhir dari halaman sebelumnya
     """
-    try:
-        async with await AsyncConnection.connect(db_uri) as conn:
-            async with conn.cursor() as cur:
-                # Optimized query dengan single JOIN
-                await cur.execute("""
-                    SELECT 
-                        c.thread_id,
-                        COUNT(DISTINCT c.checkpoint_id) as message_count,
-                        MAX(c.checkpoint_id) as last_checkpoint_id,
-                        p.id as prd_id,
-                        p.feature as prd_feature,
-                        p.version as prd_version
-                    FROM checkpoints c
-                    LEFT JOIN prds p ON p.id::text = c.thread_id 
-                        AND p.user_id = c.user_id
-                    WHERE c.user_id = %s
-                    GROUP BY c.thread_id, p.id, p.feature, p.version
-                    ORDER BY MAX(c.checkpoint_id) DESC
-                """, (user_id,))
-                
-                threads = await cur.fetchall()
-                
-                return [
-                    ThreadSummary(
-                        thread_id=row[0],
-                        message_count=row[1],
-                        last_checkpoint_id=row[2],
-                        has_prd=row[3] is not None,
-                        prd={
-                            "prd_id": str(row[3]),
-                            "feature": row[4],
-                            "version": row[5]
-                        } if row[3] else None
-                    )
-                    for row in threads
-                ]
-                
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve user threads"
-        )
+    pool = await get_pool(DB_URI)
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            # Keyset pagination; LIMIT NULL (tanpa limit) berarti semua thread
+            await cur.execute(USER_THREADS_SQL, {"user_id": user_id, "before": before, "limit": limit})
+            
+            threads = await cur.fetchall()
+            
+            return ORJSONResponse([
+                ThreadSummary(
+                    thread_id=row["thread_id"],
+                    message_count=row["message_count"],
+                    last_checkpoint_id=row["last_checkpoint_id"],
+                    has_prd=row["prd_id"] is not None,
+                    prd={
+                        "prd_id": row["prd_id"],
+                        "feature": row["prd_feature"],
+                        "version": row["prd_version"]
+                    } if row["prd_id"] else None
+                ).model_dump(mode="json")
+                for row in threads
+            ])
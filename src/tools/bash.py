@@ -1,13 +1,12 @@
 from langchain_core.tools import tool
 from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import Literal
-import subprocess
+from typing import Literal, Optional
+from collections import OrderedDict
+import asyncio
+import re
 
-from dotenv import load_dotenv
-from src.config.settings import base_model
-
-load_dotenv()
+from src.config.settings import safety_model
 
 
 class CommandSafetyValidation(BaseModel):
@@ -32,17 +31,49 @@ class BashExecutionResult(BaseModel):
     safety_validation: CommandSafetyValidation | None = None
 
 
+SAFETY_CACHE_SIZE = 1024
+
+# Read-only commands that never need the LLM check. Arguments may not contain
+# shell metacharacters or line breaks, so nothing can be chained, substituted
+# or redirected. Matched with fullmatch: `$` alone would accept a trailing "\n".
+_SAFE_COMMAND = re.compile(r"(ls|pwd|echo|whoami|uname|wc)([ \t]+[^;&|<>$`\\(){}\r\n]*)?")
+_safety_cache: "OrderedDict[str, CommandSafetyValidation]" = OrderedDict()
+
+
+def _cached_validation(command: str) -> Optional[CommandSafetyValidation]:
+    validation = _safety_cache.get(command)
+    if validation is not None:
+        _safety_cache.move_to_end(command)
+    return validation
+
+
+def _remember_validation(command: str, validation: CommandSafetyValidation) -> None:
+    _safety_cache[command] = validation
+    _safety_cache.move_to_end(command)
+    if len(_safety_cache) > SAFETY_CACHE_SIZE:
+        _safety_cache.popitem(last=False)
 
 
 async def validate_command_safety(command: str) -> CommandSafetyValidation:
     """Validate if a shell command is safe to execute, focusing on prompt injection detection."""
     
+    if _SAFE_COMMAND.fullmatch(command.strip()):
+        return CommandSafetyValidation(
+            is_safe=True,
+            threat_type="SAFE",
+            reasoning="Allowlisted read-only command without shell metacharacters.",
+        )
+
+    cached = _cached_validation(command)
+    if cached is not None:
+        return cached
+
     try:
-        if base_model is None:
+        if safety_model is None:
             return CommandSafetyValidation(
                 is_safe=False,
                 threat_type="MALICIOUS_COMMAND",
-                reasoning="base_model is not available. Cannot validate command safety.",
+                reasoning="safety_model is not available. Cannot validate command safety.",
                 detected_patterns=["BASE MODEL not Found"],
             )
 
@@ -70,10 +101,12 @@ Provide a structured assessment focusing on prompt injection and malicious inten
         parser = PydanticOutputParser(pydantic_object=CommandSafetyValidation)
         
         prompt_with_instructions = f"{safety_prompt}\n\n{parser.get_format_instructions()}"
-        response = await base_model.ainvoke(prompt_with_instructions)
+        response = await safety_model.ainvoke(prompt_with_instructions)
         
         try:
             validation_result = parser.parse(response.content)
+            # Hanya verdict yang berhasil di-parse yang di-cache, error boleh dicoba lagi
+            _remember_validation(command, validation_result)
             return validation_result
         except Exception as e:
             return CommandSafetyValidation(
@@ -122,24 +155,29 @@ async def execute_bash(command: str, timeout: int = 30) -> dict:
                 "safety_validation": safety_validation.model_dump(),
             }
         
-        # Execute command
+        # Execute command tanpa memblokir event loop
         try:
-            result = subprocess.run(
-                ["bash", "-c", command],
-                capture_output=True,
-                text=True,
-                timeout=timeout,
+            proc = await asyncio.create_subprocess_exec(
+                "bash", "-c", command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
             
             return {
-                "success": result.returncode == 0,
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
+                "success": proc.returncode == 0,
+                "returncode": proc.returncode,
+                "stdout": stdout.decode("utf-8", "replace"),
+                "stderr": stderr.decode("utf-8", "replace"),
                 "safety_validation": safety_validation.model_dump(),
             }
         
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             return {
                 "success": False,
                 "returncode": -1,
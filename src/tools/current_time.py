@@ -1,9 +1,17 @@
+import time
 from datetime import datetime
 from langchain.tools import tool
 
+# (epoch second, formatted string); the format has one-second resolution
+_last_formatted: tuple[int, str] = (0, "")
+
 
 @tool("current_time")
 def get_current_time() -> str:
     """Get the current date and time in a human-readable format."""
-    now = datetime.now()
-    return now.strftime("%A, %B %d, %Y at %I:%M:%S %p %Z")
+    global _last_formatted
+    second = int(time.time())
+    if _last_formatted[0] != second:
+        now = datetime.fromtimestamp(second)
+        _last_formatted = (second, now.strftime("%A, %B %d, %Y at %I:%M:%S %p %Z"))
+    return _last_formatted[1]
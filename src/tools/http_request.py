@@ -1,5 +1,6 @@
 from langchain_core.tools import tool
 from typing import Literal, Any
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 import httpx
 from pydantic import BaseModel, Field
 
@@ -11,6 +12,23 @@ class HttpResponse(BaseModel):
     error: str | None = None
 
 
+# Client sendiri untuk URL pilihan model: keep-alive tetap dipakai ulang antar
+# tool call, tapi terpisah dari pool LiteLLM/Tavily di settings supaya host
+# lambat tidak menghabiskan slot koneksi model. Cookie jar menolak semua cookie,
+# jadi Set-Cookie dari satu user tidak ikut terkirim di request user lain.
+# Ditutup saat shutdown lewat close_http_client.
+_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=30.0,
+    cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+)
+
+
+async def close_http_client() -> None:
+    """Close the client used by `http_request`."""
+    await _client.aclose()
+
+
 @tool
 async def http_request(
     url: str,
@@ -30,25 +48,19 @@ async def http_request(
         Response with status, headers, and data
     """
     try:
-        request_headers = {
-            "Content-Type": "application/json",
-            **(headers or {}),
-        }
+        response = await _client.request(
+            method=method,
+            url=url,
+            # httpx sets Content-Type: application/json itself when a json body is sent
+            headers=headers,
+            json=data if data and method != "GET" else None,
+        )
         
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=request_headers,
-                json=data if data and method != "GET" else None,
-                timeout=30.0,
-            )
-            
-            return {
-                "status": response.status_code,
-                "headers": dict(response.headers),
-                "data": response.text,
-            }
+        return {
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "data": response.text,
+        }
     
     except Exception as e:
         return {
@@ -1,16 +1,8 @@
-from langgraph.checkpoint.postgres import PostgresSaver
 from langchain.tools import tool, ToolRuntime
 
 from dataclasses import dataclass
 from pydantic import BaseModel, Field
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-DB_URI = os.getenv("DB_URI")
-
 @dataclass
 class Context:
     user_id: str
@@ -31,21 +23,20 @@ class EpisodicMemory(BaseModel):
         description="Outcome and retrospective. What did you do well? What could you do better next time? I ...",
     )
 
-with PostgresSaver.from_conn_string(DB_URI) as checkpointer:
-    @tool("create_memory")
-    async def create_memory(episode: EpisodicMemory, runtime: ToolRuntime[Context]) -> str:
-        """
-        Store an episode of memory in the database.
+@tool("create_memory")
+async def create_memory(episode: EpisodicMemory, runtime: ToolRuntime[Context]) -> str:
+    """
+    Store an episode of memory in the database.
 
-        Parameters:
-            episode (EpisodicMemory): The episode to store.
-            runtime (ToolRuntime[Context]): The runtime context.
+    Parameters:
+        episode (EpisodicMemory): The episode to store.
+        runtime (ToolRuntime[Context]): The runtime context.
 
-        Returns:
-            str: A success message indicating that the memory was created.
-        """
-        store = runtime.store
-        user_id = runtime.context.user_id
+    Returns:
+        str: A success message indicating that the memory was created.
+    """
+    store = runtime.store
+    user_id = runtime.context.user_id
 
-        await store.aput(("episode",), user_id, episode)
-        return "Memory created"
\ No newline at end of file
+    await store.aput(("episode",), user_id, episode)
+    return "Memory created"
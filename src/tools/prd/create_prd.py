@@ -1,6 +1,7 @@
-import asyncio
+import os
+import re
 from typing import Any, Optional
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import StructuredTool
 
@@ -9,33 +10,52 @@ from src.utils.supabase.save_prd import save_prd_tx
 from src.utils.prompts.prd import PRD_SYSTEM_PROMPT 
 from src.utils.request_context import get_thread_id, get_user_id
 from src.utils.stream_response import _chunk_to_text
+from src.utils.cache import TTLCache
 
-from uuid import UUID
+# A repeat of the same feature request from the same user reuses the last PRD
+# instead of another multi-second generation. Matching is exact after
+# normalization: similar but distinct features must never share a PRD body.
+PRD_CACHE_TTL = float(os.getenv("PRD_CACHE_TTL", "300"))
+PRD_CACHE_SIZE = int(os.getenv("PRD_CACHE_SIZE", "256"))
+
+_prd_cache: TTLCache[str] = TTLCache(maxsize=PRD_CACHE_SIZE, ttl=PRD_CACHE_TTL)
+UUID_PATTERN = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$",
+    re.IGNORECASE,
+)
+
+# Built once; identical for every PRD request
+PRD_SYSTEM_MESSAGE = SystemMessage(content=PRD_SYSTEM_PROMPT)
 
 class GeneratePRDInput(BaseModel):
     """Input schema for generating a PRD."""
     feature: str = Field(..., description="Feature name or description to generate PRD for")
     user_id: Optional[str] = Field(default=None, description="Supabase user ID for ownership of the PRD")
     prd_id: Optional[str] = Field(default=None, description="Optional existing PRD ID (UUID) when regenerating")
+    no_cache: bool = Field(default=False, description="Always generate a fresh PRD, even if the same feature was generated recently")
 
-async def generate_prd_async(**kwargs: Any):
+def _normalize_feature(feature: str) -> str:
+    return " ".join(feature.lower().split()).strip(".!?")
+
+async def generate_prd_async(**kwargs: Any) -> str:
     """
     Generate a new PRD based on feature description.
     
     Args:
-        **kwargs: feature (str, required), user_id (str, optional, falls back to context), prd_id (str, optional, defaults to thread_id).
+        **kwargs: feature (str, required), user_id (str, optional, falls back to context), prd_id (str, optional, defaults to thread_id), no_cache (bool, optional).
     
     Returns:
         str: Generated PRD JSON with ID and version info.
     """
-    try:
-        input_data = GeneratePRDInput.model_validate(kwargs)
-    except ValidationError as e:
-        raise ValueError(f"Invalid input: {e}. Need 'feature' parameter.")
-
-    feature = input_data.feature
-    user_id = input_data.user_id or get_user_id()
-    prd_id = input_data.prd_id or get_thread_id()
+    # StructuredTool already validated kwargs against GeneratePRDInput
+    feature = kwargs.get("feature")
+    if not isinstance(feature, str):
+        raise ValueError("Invalid input: need 'feature' parameter.")
+    user_id = kwargs.get("user_id") or get_user_id()
+    explicit_prd_id = kwargs.get("prd_id")
+    prd_id = explicit_prd_id or get_thread_id()
+    # An explicit prd_id means the user asked to regenerate that PRD
+    use_cache = not kwargs.get("no_cache", False) and not explicit_prd_id
 
     if not feature:
         raise ValueError("Feature description is required.")
@@ -43,14 +63,11 @@ async def generate_prd_async(**kwargs: Any):
         raise ValueError("user_id is required.")
 
     # Validate PRD ID format if provided
-    if prd_id:
-        try:
-            UUID(prd_id)
-        except (ValueError, TypeError):
-            raise ValueError("prd_id must be a valid UUID string if provided.")
+    if prd_id and not (isinstance(prd_id, str) and UUID_PATTERN.match(prd_id)):
+        raise ValueError("prd_id must be a valid UUID string if provided.")
 
     messages = [
-        SystemMessage(content=PRD_SYSTEM_PROMPT),
+        PRD_SYSTEM_MESSAGE,
         HumanMessage(
             content=(
                 "Use the provided schema to create a PRD. "
@@ -61,22 +78,27 @@ async def generate_prd_async(**kwargs: Any):
         )
     ]
 
+    cache_key = (user_id, _normalize_feature(feature))
+    cached_prd = _prd_cache.get(cache_key) if use_cache else None
+
     try:
-        full_prd_text = ""
-        async for chunk in llm.astream(messages):
-            text = _chunk_to_text(chunk)
-            if text:
-                full_prd_text += text
-
-        save_task = asyncio.create_task(
-            save_prd_tx(
-                full_prd_text,
-                user_id=user_id,
-                feature_name=feature,
-                prd_id=prd_id,
-            )
+        if cached_prd is not None:
+            full_prd_text = cached_prd
+        else:
+            parts: list[str] = []
+            async for chunk in llm.astream(messages):
+                text = _chunk_to_text(chunk)
+                if text:
+                    parts.append(text)
+            full_prd_text = "".join(parts)
+            _prd_cache.set(cache_key, full_prd_text)
+
+        await save_prd_tx(
+            full_prd_text,
+            user_id=user_id,
+            feature_name=feature,
+            prd_id=prd_id,
         )
-        await save_task
 
         summary = (
             "✅ PRD generated successfully!\n"
@@ -87,19 +109,17 @@ async def generate_prd_async(**kwargs: Any):
     except Exception as e:
         raise RuntimeError(f"Failed to generate PRD: {str(e)}")
 
-# Sync wrapper
-def generate_prd_sync(**kwargs: Any) -> str:
-    return asyncio.run(generate_prd_async(**kwargs))
 
-# StructuredTool
+# StructuredTool, async only: the PRD tools use the app loop's DB pool, HTTP
+# client and embedding batcher, none of which may be driven from another loop.
 generate_prd = StructuredTool.from_function(
-    func=generate_prd_sync,
     name="generate_prd",
     description=(
         "Generate a new Product Requirements Document (PRD) based on feature description. "
-        "Parameters: feature (str, required), user_id (str, optional - defaults to context user), prd_id (str, optional existing PRD UUID/default thread_id). "
+        "Parameters: feature (str, required), user_id (str, optional - defaults to context user), prd_id (str, optional existing PRD UUID/default thread_id), "
+        "no_cache (bool, optional - set true when the user explicitly asks for a fresh PRD). "
         "Returns generated PRD with ID for future updates."
     ),
     args_schema=GeneratePRDInput,
-    coroutine=lambda **kwargs: generate_prd_async(**kwargs),
+    coroutine=generate_prd_async,
 )
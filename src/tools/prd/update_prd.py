@@ -1,13 +1,16 @@
-import asyncio
-import json
+import hashlib
+import os
+import orjson
 from typing import Any, Optional, Type
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import StructuredTool
+from psycopg import sql
 
-from src.config.settings import medium_model as llm
-from src.utils.supabase.client import supabase
-from src.utils.request_context import get_thread_id
+from src.config.settings import DB_URI, medium_model as llm
+from src.utils.db import get_pool
+from src.utils.cache import TTLCache
+from src.utils.request_context import get_thread_id, get_user_id
 from src.utils.stream_response import _chunk_to_text 
 
 UPDATE_SYSTEM_PROMPT = """You are an expert Product Manager updating an existing PRD section based on user feedback.
@@ -21,6 +24,19 @@ CRITICAL RULES:
 6. Always use English.
 7. Output ONLY the Markdown content for the section. No JSON, no extra text, no headers outside the section."""
 
+# Feedback that asks for no change at all; answered without the LLM or a DB write
+TRIVIAL_FEEDBACK = frozenset({
+    "ok", "okay", "oke", "no", "nope", "nothing", "none", "fine", "good",
+    "sip", "tidak", "ga", "gak", "nggak",
+})
+
+# Exact LLM output per (section, existing content, feedback). A hit skips only
+# the LLM call; the result is still written with the usual version check.
+UPDATE_LLM_CACHE_SIZE = int(os.getenv("UPDATE_LLM_CACHE_SIZE", "1000"))
+UPDATE_LLM_CACHE_TTL = float(os.getenv("UPDATE_LLM_CACHE_TTL", "3600"))
+
+_llm_output_cache: TTLCache[str] = TTLCache(maxsize=UPDATE_LLM_CACHE_SIZE, ttl=UPDATE_LLM_CACHE_TTL)
+
 class UpdatePRDInput(BaseModel):
     """Input schema for updating a PRD section."""
     feedback: str = Field(..., description="Natural language feedback/query for the update (e.g., 'Add offline support')")
@@ -39,6 +55,31 @@ SECTION_FIELD_TYPES: dict[str, Type[Any]] = {
     "timeline": dict[str, Any],
 }
 
+# One prebuilt system message per updatable section
+UPDATE_SYSTEM_MESSAGES: dict[str, SystemMessage] = {
+    section: SystemMessage(content=UPDATE_SYSTEM_PROMPT.replace("{section}", section))
+    for section in SECTION_FIELD_TYPES
+}
+
+# Section names are column names; only these prebuilt statements ever reach the DB.
+# The pool connects with DB_URI, so no RLS applies: every statement is scoped
+# to the calling user explicitly.
+SELECT_SECTION_SQL: dict[str, sql.Composed] = {
+    section: sql.SQL(
+        "SELECT {}, version FROM prds WHERE id = %s AND user_id = %s LIMIT 1"
+    ).format(sql.Identifier(section))
+    for section in SECTION_FIELD_TYPES
+}
+# Bumps the version only if nobody else updated the PRD since it was read
+UPDATE_SECTION_SQL: dict[str, sql.Composed] = {
+    section: sql.SQL(
+        "UPDATE prds SET {} = %s, version = COALESCE(version, 0) + 1 "
+        "WHERE id = %s AND user_id = %s AND version IS NOT DISTINCT FROM %s "
+        "RETURNING version"
+    ).format(sql.Identifier(section))
+    for section in SECTION_FIELD_TYPES
+}
+
 SECTION_ALIASES: dict[str, str] = {
     "acceptance_criteria": "functional_requirements",
 }
@@ -46,16 +87,24 @@ SECTION_ALIASES: dict[str, str] = {
 def _normalize_section_name(section: str) -> str:
     return section.strip().lower()
 
+# Every accepted section name (canonical or alias) resolved to its column up front
+_CANONICAL_SECTIONS: dict[str, str] = {
+    **{section: section for section in SECTION_FIELD_TYPES},
+    **SECTION_ALIASES,
+}
+_AVAILABLE_SECTIONS = ", ".join(sorted(SECTION_FIELD_TYPES))
+
 def _resolve_section_name(section: str) -> str:
-    normalized = _normalize_section_name(section)
-    canonical = SECTION_ALIASES.get(normalized, normalized)
-    if canonical not in SECTION_FIELD_TYPES:
-        available = ", ".join(sorted(SECTION_FIELD_TYPES.keys()))
+    canonical = _CANONICAL_SECTIONS.get(_normalize_section_name(section))
+    if canonical is None:
         raise ValueError(
-            f"Unsupported section '{section}'. Available sections: {available}"
+            f"Unsupported section '{section}'. Available sections: {_AVAILABLE_SECTIONS}"
         )
     return canonical
 
+def _llm_cache_key(section: str, existing: str, feedback: str) -> str:
+    return hashlib.blake2b(f"{section}\0{existing}\0{feedback}".encode(), digest_size=16).hexdigest()
+
 def _deserialize_value(value: Any) -> Any:
     if value is None:
         return None
@@ -64,32 +113,24 @@ def _deserialize_value(value: Any) -> Any:
         if not stripped:
             return ""
         try:
-            return json.loads(stripped)
-        except json.JSONDecodeError:
+            return orjson.loads(stripped)
+        except orjson.JSONDecodeError:
             return value
     return value
 
-def _serialize_value(value: Any) -> Optional[str]:
-    if value is None:
-        return None
-    if isinstance(value, (dict, list)):
-        return json.dumps(value, ensure_ascii=False)
-    return str(value)  # Untuk markdown, langsung str
-
 async def update_prd_async(**kwargs: Any) -> str:
     """
     Update a specific section of an existing PRD based on feedback.
     Collects full LLM output (Markdown) and processes/saves.
     Returns pure LLM Markdown + summary.
     """
-    try:
-        input_data = UpdatePRDInput.model_validate(kwargs)
-    except ValidationError as e:
-        raise ValueError(f"Invalid input: {e}. Need 'feedback' and 'section'.")
-
-    feedback = input_data.feedback
-    prd_id = input_data.prd_id or get_thread_id()
-    requested_section = input_data.section
+    # StructuredTool already validated kwargs against UpdatePRDInput
+    feedback = kwargs.get("feedback")
+    requested_section = kwargs.get("section")
+    if not isinstance(feedback, str) or not isinstance(requested_section, str):
+        raise ValueError("Invalid input: need 'feedback' and 'section'.")
+    prd_id = kwargs.get("prd_id") or get_thread_id()
+    user_id = get_user_id()
     section = _resolve_section_name(requested_section)
     display_section = requested_section
     if _normalize_section_name(requested_section) != section:
@@ -99,26 +140,30 @@ async def update_prd_async(**kwargs: Any) -> str:
         raise ValueError("Feedback and section are required.")
     if not prd_id:
         raise ValueError("PRD ID is required but missing. Make sure to supply thread_id when calling this tool.")
+    if not user_id:
+        raise ValueError("user_id is required to update a PRD.")
+
+    if feedback.strip().strip(".!").lower() in TRIVIAL_FEEDBACK:
+        return f"ℹ️ No changes requested for '{display_section}'\n📄 PRD ID: {prd_id}"
 
     # Fetch existing section and version
-    select_cols = f"{section},version"
+    pool = await get_pool(DB_URI)
     try:
-        existing_data = await asyncio.to_thread(
-            lambda: supabase.table("prds").select(select_cols).eq("id", prd_id).limit(1).execute()
-        )
+        async with pool.connection() as conn:
+            cur = await conn.execute(SELECT_SECTION_SQL[section], (prd_id, user_id))
+            existing_row = await cur.fetchone()
     except Exception as e:
         raise ValueError(f"Failed to fetch PRD {prd_id}: {str(e)}")
 
-    if not existing_data.data:
+    if not existing_row:
         raise ValueError(f"PRD with ID {prd_id} not found in database")
 
-    existing_row = existing_data.data[0]
     existing_section_value = _deserialize_value(existing_row.get(section))
-    existing_version = existing_row.get("version", 0) or 0
+    read_version = existing_row.get("version")
 
     # Prepare messages
     pretty_existing = (
-        json.dumps(existing_section_value, ensure_ascii=False, indent=2)
+        orjson.dumps(existing_section_value, option=orjson.OPT_INDENT_2).decode()
         if isinstance(existing_section_value, (dict, list))
         else str(existing_section_value or "")
     )
@@ -127,23 +172,27 @@ async def update_prd_async(**kwargs: Any) -> str:
         f"USER FEEDBACK: {feedback}\n\n"
         f"Output the updated section in detailed Markdown format as per the system prompt."
     )
-    prompt = UPDATE_SYSTEM_PROMPT.replace("{section}", section)
     messages = [
-        SystemMessage(content=prompt),
+        UPDATE_SYSTEM_MESSAGES[section],
         HumanMessage(content=human_content),
     ]
 
-    # Stream and collect full LLM output
-    full_text = ""
-    async for chunk in llm.astream(messages):
-        text = _chunk_to_text(chunk)
-        if text:
-            full_text += text
+    # Stream and collect full LLM output, unless this exact update was generated before
+    llm_cache_key = _llm_cache_key(section, pretty_existing, feedback)
+    full_text = _llm_output_cache.get(llm_cache_key)
+    if full_text is None:
+        parts: list[str] = []
+        async for chunk in llm.astream(messages):
+            text = _chunk_to_text(chunk)
+            if text:
+                parts.append(text)
+        full_text = "".join(parts)
 
     try:
         updated_section = full_text.strip()
         if not updated_section:
             raise ValueError("LLM output is empty")
+        _llm_output_cache.set(llm_cache_key, full_text)
 
         old_len = len(str(existing_section_value)) if existing_section_value else 0
         new_len = len(updated_section)
@@ -151,15 +200,13 @@ async def update_prd_async(**kwargs: Any) -> str:
         if new_len > old_len:
             changes_summary += f" (added details)"
 
-        new_version = existing_version + 1
-        serialized_section = _serialize_value(updated_section)
-        await asyncio.to_thread(
-            lambda: supabase
-            .table("prds")
-            .update({section: serialized_section, "version": new_version})
-            .eq("id", prd_id)
-            .execute()
-        )
+        # Section columns are TEXT and the update is always Markdown; bind it as is
+        async with pool.connection() as conn:
+            cur = await conn.execute(UPDATE_SECTION_SQL[section], (updated_section, prd_id, user_id, read_version))
+            updated_row = await cur.fetchone()
+        if updated_row is None:
+            raise ValueError(f"PRD {prd_id} was modified while updating '{section}'; retry the update")
+        new_version = updated_row["version"]
 
         # Return pure LLM Markdown + summary
         summary = f"\n\n✅ {changes_summary}\n📄 PRD ID: {prd_id}\n🔢 Version: {new_version}"
@@ -168,12 +215,8 @@ async def update_prd_async(**kwargs: Any) -> str:
     except Exception as e:
         raise RuntimeError(f"Failed to update PRD: {str(e)}")
 
-# Sync wrapper
-def update_prd_sync(**kwargs: Any) -> str:
-    return asyncio.run(update_prd_async(**kwargs))
-
+# Async only, like generate_prd
 update_prd = StructuredTool.from_function(
-    func=update_prd_sync,
     name="update_prd",
     description=(
         "Update a specific section of an existing PRD based on feedback. "
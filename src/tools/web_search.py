@@ -1,24 +1,32 @@
 from langchain_core.tools import tool
-from tavily import TavilyClient
 
-import os
-from dotenv import load_dotenv
 from typing import Literal
 
+from src.config.settings import TAVILY_API_KEY, http_async_client
+
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+TAVILY_TIMEOUT = 60.0
 
-load_dotenv()
 
-tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
 @tool
-def web_search(query: str,
+async def web_search(query: str,
     max_results: int = 5,
     topic: Literal["general", "news", "finance"] = "general",
     include_raw_content: bool = False,
 ):
     """Run a web search"""
-    return tavily_client.search(
-        query,
-        max_results=max_results,
-        include_raw_content=include_raw_content,
-        topic=topic,
-    )
\ No newline at end of file
+    # Tavily's SDK opens a new connection per call; go through the shared
+    # keep-alive client so repeated searches skip the TLS handshake.
+    response = await http_async_client.post(
+        TAVILY_SEARCH_URL,
+        headers={"Authorization": f"Bearer {TAVILY_API_KEY}"},
+        json={
+            "query": query,
+            "max_results": max_results,
+            "topic": topic,
+            "include_raw_content": include_raw_content,
+        },
+        timeout=TAVILY_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
@@ -1,5 +1,9 @@
+import logging
+
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 
+logger = logging.getLogger(__name__)
+
 
 class UserAwarePostgresSaver(AsyncPostgresSaver):
     """
@@ -20,7 +24,7 @@ class UserAwarePostgresSaver(AsyncPostgresSaver):
         
         if user_id and thread_id and self.conn:
             try:
-                async with self.conn.cursor() as cur:
+                async with self._cursor() as cur:
                     await cur.execute(
                         """
                         UPDATE checkpoints 
@@ -36,8 +40,7 @@ class UserAwarePostgresSaver(AsyncPostgresSaver):
                         """,
                         (user_id, thread_id, thread_id)
                     )
-                await self.conn.commit()
             except Exception as e:
-                print(f"Warning: Failed to update user_id in checkpoint: {e}")
+                logger.warning("Failed to update user_id in checkpoint: %s", e)
         
         return result
\ No newline at end of file
@@ -0,0 +1,63 @@
+import asyncio
+import os
+from typing import Optional
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+# Every agent step writes a checkpoint; scale the pool with the host.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "4"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", str(min(32, 4 * (os.cpu_count() or 1)))))
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def _configure_connection(conn: AsyncConnection) -> None:
+    # Utility statements cannot be server-side prepared.
+    await conn.execute(f"SET hnsw.ef_search = {HNSW_EF_SEARCH}", prepare=False)
+
+
+def create_pool(
+    db_uri: str,
+    *,
+    min_size: int = DB_POOL_MIN_SIZE,
+    max_size: int = DB_POOL_MAX_SIZE,
+) -> AsyncConnectionPool:
+    """
+    Build an (unopened) connection pool shared by the checkpointer, store and raw queries.
+
+    Connections are configured the way LangGraph's Postgres saver/store expect:
+    autocommit, dict rows and `prepare_threshold=0`. Each new connection also
+    gets `hnsw.ef_search` so store searches use the HNSW recall/speed trade-off.
+    """
+    return AsyncConnectionPool(
+        db_uri,
+        min_size=min_size,
+        max_size=max_size,
+        open=False,
+        configure=_configure_connection,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+    )
+
+
+async def get_pool(db_uri: str) -> AsyncConnectionPool:
+    """Return the process-wide pool, opening it on first use."""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                pool = create_pool(db_uri)
+                await pool.open()
+                _pool = pool
+    return _pool
+
+
+async def close_pool() -> None:
+    """Close the process-wide pool if it was opened."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
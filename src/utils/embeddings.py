@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from src.config.settings import embedding
+
+EMBED_BATCH_SIZE = embedding.chunk_size
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "8"))
+EMBED_BATCH_WINDOW = float(os.getenv("EMBED_BATCH_WINDOW_MS", "10")) / 1000
+EMBED_DIMS = 1536
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_RECENCY_WEIGHT = float(os.getenv("EMBED_CACHE_RECENCY_WEIGHT", "0.3"))
+EMBED_CACHE_DECAY_PER_HOUR = float(os.getenv("EMBED_CACHE_DECAY_PER_HOUR", "0.01"))
+EMBED_CACHE_HIT_HALF_LIFE_HOURS = float(os.getenv("EMBED_CACHE_HIT_HALF_LIFE_HOURS", "1"))
+EMBED_CACHE_PROBATION = int(os.getenv("EMBED_CACHE_PROBATION", str(max(1, EMBED_CACHE_SIZE // 8))))
+
+_async_slots = asyncio.Semaphore(EMBED_MAX_WORKERS)
+
+
+def _l2_normalize(vectors: list[list[float]]) -> list[list[float]]:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix.tolist()
+
+
+def _cache_key(text: str) -> bytes:
+    # The model name is part of the key so a model switch never reuses vectors.
+    return hashlib.blake2b(f"{embedding.model}\0{text}".encode(), digest_size=16).digest()
+
+
+class _EmbeddingCache:
+    """
+    Fixed-size vector cache that evicts by hit count and recency together.
+
+    The victim is the entry with the lowest
+    `log1p(hits) * (1 - w) + exp(-decay * age_hours) * w`, so vectors that
+    keep being reused survive bursts of one-off texts. Hit counts halve every
+    `hit_half_life_hours` without use, so old favourites cannot pin the cache
+    forever, and the `probation` most recent inserts are never evicted, so a
+    new text gets the chance to earn hits before it competes with them.
+    Per-slot metadata lives in parallel numpy arrays, making the victim search
+    one vectorized argmin. Not thread-safe; only used from the event loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        recency_weight: float,
+        decay_per_hour: float,
+        hit_half_life_hours: float,
+        probation: int,
+    ) -> None:
+        self._maxsize = maxsize
+        self._recency_weight = recency_weight
+        self._decay_per_hour = decay_per_hour
+        self._hit_half_life_hours = hit_half_life_hours
+        # At least one slot must stay evictable
+        self._probation = min(probation, maxsize - 1)
+        self._slots: dict[bytes, int] = {}
+        self._keys: list[Optional[bytes]] = [None] * maxsize
+        self._vectors: list[Optional[list[float]]] = [None] * maxsize
+        self._hits = np.zeros(maxsize, dtype=np.float64)
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._inserted = np.zeros(maxsize, dtype=np.int64)
+        self._inserts = 0
+
+    def lookup(self, keys: list[bytes]) -> tuple[list[Optional[list[float]]], dict[bytes, list[int]]]:
+        """
+        Return cached vectors in order plus the positions of each missed key.
+
+        Repeated texts share one key, so each distinct miss is embedded only once.
+        """
+        vectors: list[Optional[list[float]]] = []
+        missing: dict[bytes, list[int]] = {}
+        now = time.monotonic()
+        for index, key in enumerate(keys):
+            slot = self._slots.get(key)
+            if slot is None:
+                missing.setdefault(key, []).append(index)
+                vectors.append(None)
+                continue
+            self._hits[slot] = self._decayed_hits(self._hits[slot], now - self._last_used[slot]) + 1
+            self._last_used[slot] = now
+            vectors.append(self._vectors[slot])
+        return vectors, missing
+
+    def store(self, keys: list[bytes], vectors: list[list[float]]) -> None:
+        now = time.monotonic()
+        for key, vector in zip(keys, vectors):
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._free_slot(now)
+                self._slots[key] = slot
+                self._keys[slot] = key
+                self._hits[slot] = 0
+                self._inserts += 1
+                self._inserted[slot] = self._inserts
+            self._vectors[slot] = vector
+            self._last_used[slot] = now
+
+    def _decayed_hits(self, hits, age_seconds):
+        return hits * 0.5 ** (age_seconds / 3600 / self._hit_half_life_hours)
+
+    def _free_slot(self, now: float) -> int:
+        if len(self._slots) < self._maxsize:
+            return len(self._slots)
+
+        age_hours = (now - self._last_used) / 3600
+        scores = (
+            np.log1p(self._decayed_hits(self._hits, now - self._last_used)) * (1 - self._recency_weight)
+            + np.exp(-self._decay_per_hour * age_hours) * self._recency_weight
+        )
+        scores[self._inserted > self._inserts - self._probation] = np.inf
+        victim = int(scores.argmin())
+        del self._slots[self._keys[victim]]
+        return victim
+
+
+_embedding_cache = _EmbeddingCache(
+    EMBED_CACHE_SIZE,
+    recency_weight=EMBED_CACHE_RECENCY_WEIGHT,
+    decay_per_hour=EMBED_CACHE_DECAY_PER_HOUR,
+    hit_half_life_hours=EMBED_CACHE_HIT_HALF_LIFE_HOURS,
+    probation=EMBED_CACHE_PROBATION,
+)
+
+
+def _missing_texts(texts: list[str], missing: dict[bytes, list[int]]) -> list[str]:
+    return [texts[positions[0]] for positions in missing.values()]
+
+
+def _fill_missing(
+    vectors: list[Optional[list[float]]],
+    missing: dict[bytes, list[int]],
+    fresh: list[list[float]],
+) -> list[list[float]]:
+    for positions, vector in zip(missing.values(), fresh):
+        for index in positions:
+            vectors[index] = vector
+    _embedding_cache.store(list(missing), fresh)
+    return vectors
+
+
+async def _aembed_batch(batch: list[str]) -> list[list[float]]:
+    async with _async_slots:
+        return await embedding.aembed_documents(batch)
+
+
+class _EmbeddingBatcher:
+    """
+    Coalesce concurrent embedding requests into shared API calls.
+
+    Texts queued within EMBED_BATCH_WINDOW are sent together, split into
+    EMBED_BATCH_SIZE sub-batches; a full batch is sent immediately.
+    """
+
+    def __init__(self, window: float, max_batch: int) -> None:
+        self._window = window
+        self._max_batch = max_batch
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: set[asyncio.Task] = set()
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        self._pending.extend(zip(texts, futures))
+
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self._max_batch):
+            task = asyncio.ensure_future(self._send(pending[start:start + self._max_batch]))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await _aembed_batch([text for text, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+_batcher = _EmbeddingBatcher(EMBED_BATCH_WINDOW, EMBED_BATCH_SIZE)
+
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    Embed texts for the async Postgres store.
+
+    Texts seen before are served from a content-addressed LRU; only misses
+    are sent, coalesced across concurrent callers and pipelined on the event
+    loop, at most EMBED_MAX_WORKERS in flight.
+    """
+    if not texts:
+        return []
+
+    keys = [_cache_key(text) for text in texts]
+    vectors, missing = _embedding_cache.lookup(keys)
+    if not missing:
+        return vectors
+
+    fresh = _l2_normalize(await _batcher.embed(_missing_texts(texts, missing)))
+    return _fill_missing(vectors, missing, fresh)
+
+
+# pgvector index for the LangGraph store. HNSW keeps semantic memory search
+# sub-linear; `ef_search` is set per connection in `src.utils.db`. Vectors are
+# stored as fp16 `halfvec`; embeddings stay fp32 and Postgres casts on insert.
+# Vectors are unit length, so inner product ranks the same as cosine.
+STORE_INDEX = {
+    "dims": EMBED_DIMS,
+    "embed": aembed_texts,
+    "distance_type": "inner_product",
+    "ann_index_config": {
+        "kind": "hnsw",
+        "vector_type": "halfvec",
+        "m": 16,
+        "ef_construction": 64,
+    },
+}
@@ -1,5 +1,8 @@
-import json
-from typing import AsyncGenerator, Any
+import asyncio
+import os
+import time
+import orjson
+from typing import AsyncGenerator, Any, Optional
 from langchain_core.messages import AIMessage, ToolMessage, HumanMessage, AIMessageChunk
 
 from src.utils.request_context import (
@@ -10,8 +13,65 @@ from src.utils.request_context import (
 )
 from src.tools.memory import Context
 
-def _sse(data: dict[str, Any]) -> str:
-    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+# Text tokens are coalesced into one SSE event per STREAM_BATCH_SIZE tokens or
+# STREAM_BATCH_MS, whichever comes first; the first token is always sent at once.
+# Buffered text is also flushed when the window runs out while the model pauses.
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "20"))
+STREAM_BATCH_WINDOW = float(os.getenv("STREAM_BATCH_MS", "25")) / 1000
+
+def _sse(data: dict[str, Any]) -> bytes:
+    # Encoded once here so Starlette does not re-encode every chunk
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+class _TextBatcher:
+    """Buffer streamed text blocks and emit them as merged assistant events."""
+
+    def __init__(self) -> None:
+        self._block: Optional[dict[str, Any]] = None
+        self._parts: list[str] = []
+        self._last_flush: Optional[float] = None
+
+    def add(self, block: dict[str, Any]) -> Optional[bytes]:
+        if self._block is None:
+            self._block = block
+        self._parts.append(block["text"])
+
+        now = time.monotonic()
+        if (
+            self._last_flush is None
+            or len(self._parts) >= STREAM_BATCH_SIZE
+            or now - self._last_flush >= STREAM_BATCH_WINDOW
+        ):
+            return self.flush(now)
+        return None
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until buffered text is due, or None when nothing is buffered."""
+        if not self._parts:
+            return None
+        return max(0.0, self._last_flush + STREAM_BATCH_WINDOW - time.monotonic())
+
+    def flush(self, now: Optional[float] = None) -> Optional[bytes]:
+        if not self._parts:
+            return None
+        block = {**self._block, "text": "".join(self._parts)}
+        self._block = None
+        self._parts = []
+        self._last_flush = now if now is not None else time.monotonic()
+        return _sse({"type": "assistant", "data": block})
+
+
+async def _pump(stream, queue: asyncio.Queue) -> None:
+    # The agent stream is consumed by this one task so its context stays intact;
+    # the reader waits on the queue with a timeout instead.
+    try:
+        async for item in stream:
+            queue.put_nowait(item)
+    except Exception as exc:
+        queue.put_nowait(exc)
+    else:
+        queue.put_nowait(None)
 
 
 def _extract_text_content(content: Any) -> str:
@@ -68,7 +128,7 @@ def _chunk_to_text(chunk: Any) -> str:
     return str(chunk)
 
 
-async def stream_response(agent, query: str, config) -> AsyncGenerator[str, None]:
+async def stream_response(agent, query: str, config) -> AsyncGenerator[bytes, None]:
     """
     Stream a response from an LLM agent.
 
@@ -87,17 +147,41 @@ async def stream_response(agent, query: str, config) -> AsyncGenerator[str, None
     user_token = set_user_id(configurable.get("user_id"))
     
     current_tool = None
-    
-    try:
-        async for chunk, _metadata in agent.astream(
+    text = _TextBatcher()
+    queue: asyncio.Queue = asyncio.Queue()
+    pump = asyncio.create_task(_pump(
+        agent.astream(
             {"messages": [{"role": "user", "content": query}]},
             config=config,
             stream_mode="messages",
             context=Context(user_id=user_token),
-        ):
+        ),
+        queue,
+    ))
+    
+    try:
+        while True:
+            timeout = text.time_left()
+            if timeout is None:
+                item = await queue.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if (pending := text.flush()) is not None:
+                        yield pending
+                    continue
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            chunk, _metadata = item
             node = _metadata.get("langgraph_node")  
             if node == "model":
                 if chunk.tool_call_chunks:
+                    if (pending := text.flush()) is not None:
+                        yield pending
                     for tool_chunk in chunk.tool_call_chunks:
                         name = tool_chunk.get("name")
                         if name:
@@ -105,8 +189,16 @@ async def stream_response(agent, query: str, config) -> AsyncGenerator[str, None
                             current_tool = name
                 elif chunk.content_blocks:
                     for block in chunk.content_blocks:
+                        if block.get("type") == "text":
+                            if (batch := text.add(block)) is not None:
+                                yield batch
+                            continue
+                        if (pending := text.flush()) is not None:
+                            yield pending
                         yield _sse({"type": "assistant", "data": block})
             elif node == "tools":
+                if (pending := text.flush()) is not None:
+                    yield pending
                 if chunk.content_blocks:
                     for block in chunk.content_blocks:
                         yield _sse({"type": "tool_content", "data": block})
@@ -114,14 +206,19 @@ async def stream_response(agent, query: str, config) -> AsyncGenerator[str, None
                     yield _sse({"type": "tool_end", "tool_name": current_tool})
                     current_tool = None
 
+        if (pending := text.flush()) is not None:
+            yield pending
         yield _sse({"type": "done"})
 
     except Exception as exc:
+        if (pending := text.flush()) is not None:
+            yield pending
         yield _sse({
             "type": "error",
             "message": str(exc),
             "error_type": type(exc).__name__
         })
     finally:
+        pump.cancel()
         reset_thread_id(thread_token)
         reset_user_id(user_token)
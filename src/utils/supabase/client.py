@@ -1,11 +1,6 @@
-import os
 from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+from src.config.settings import SUPABASE_URL, SUPABASE_ANON_KEY as SUPABASE_KEY
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment")
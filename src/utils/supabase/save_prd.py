@@ -1,4 +1,5 @@
-import json
+import asyncio
+import orjson
 import re
 from typing import Any, Optional
 from src.utils.request_context import get_thread_id, get_user_id
@@ -60,7 +61,7 @@ def _serialize_value(value: Any) -> Optional[str]:
     if value is None:
         return None
     if isinstance(value, (dict, list)):
-        return json.dumps(value, ensure_ascii=False)
+        return orjson.dumps(value).decode()
     return str(value)
 
 
@@ -127,7 +128,8 @@ async def save_prd_tx(prd, user_id: str, feature_name: str, prd_id: Optional[str
         "p_metrics": _serialize_value(prd_dict.get("metrics")),
     }
     
-    response = supabase.rpc("save_prd_tx", params).execute()
+    # supabase-py is synchronous; keep the RPC round-trip off the event loop.
+    response = await asyncio.to_thread(supabase.rpc("save_prd_tx", params).execute)
     
     if not response.data:
         raise RuntimeError(f"Failed to save PRD: {response}")
@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+# settings builds the OpenAI clients at import; no request is made in these tests
+os.environ.setdefault("LITELLM_API_KEY", "test")
+
+from src.tools import bash
+
+
+class _RecordingModel:
+    """Stands in for safety_model and flags every command as unsafe."""
+
+    def __init__(self) -> None:
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt: str):
+        self.prompts.append(prompt)
+
+        class _Response:
+            content = (
+                '{"is_safe": false, "threat_type": "MALICIOUS_COMMAND", '
+                '"reasoning": "chained command", "detected_patterns": []}'
+            )
+
+        return _Response()
+
+
+def test_allowlisted_command_skips_llm_check(monkeypatch):
+    model = _RecordingModel()
+    monkeypatch.setattr(bash, "safety_model", model)
+
+    result = asyncio.run(bash.validate_command_safety("ls -la"))
+
+    assert result.is_safe
+    assert model.prompts == []
+
+
+def test_newline_chained_command_is_not_allowlisted(monkeypatch):
+    for command in ("ls\nrm -rf ~", "ls\r\nid", "pwd\rid"):
+        model = _RecordingModel()
+        monkeypatch.setattr(bash, "safety_model", model)
+        bash._safety_cache.clear()
+
+        result = asyncio.run(bash.validate_command_safety(command))
+
+        assert not result.is_safe
+        assert len(model.prompts) == 1